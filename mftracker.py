@@ -1,10 +1,42 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import date
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import time
+import csv
+import functools
+import json
 import uuid
+import requests
+from requests.adapters import HTTPAdapter
 from supabase import create_client, Client
 import os
 
+try:
+    from supabase import ClientOptions
+except ImportError:
+    ClientOptions = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None
+
+try:
+    from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+except ImportError:
+    rf_process = None
+
 st.set_page_config(page_title="MF Tracker", layout="wide")
 
 # -------------------------
@@ -13,125 +45,499 @@ st.set_page_config(page_title="MF Tracker", layout="wide")
 SUPABASE_URL = st.secrets.get("SUPABASE_URL")
 SUPABASE_KEY = st.secrets.get("SUPABASE_KEY")
 TABLE_NAME = "mf_transactions"
-LOCAL_CSV = "holdings.csv"
+LOCAL_CSV = "holdings.csv"  # append-only journal for inserts + one-time migration source
+LOCAL_PARQUET = "holdings.parquet"
+RECORD_COLUMNS = ["id","user_name","mf_name","scheme_code","purchase_date","purchase_nav","units","amount","notes","current_nav","profit_loss"]
+CATEGORICAL_COLUMNS = ("user_name", "mf_name")
+
+@st.cache_resource
+def get_supabase() -> Client:
+    # one client (and one underlying httpx pool) per process, not per rerun
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        return None
+    if ClientOptions is not None:
+        options = ClientOptions(postgrest_client_timeout=30, storage_client_timeout=30)
+        return create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+@st.cache_resource
+def get_http():
+    # keep-alive session shared across reruns so repeat AMFI fetches skip
+    # the TCP/TLS handshake
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-use_db = False
 supabase: Client = None
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        use_db = True
-        st.info("✅ Supabase connected")
-    except Exception as e:
-        st.warning(f"Could not connect to Supabase: {e}")
+try:
+    supabase = get_supabase()
+except Exception as e:
+    st.warning(f"Could not connect to Supabase: {e}")
+use_db = supabase is not None
+if use_db:
+    st.info("✅ Supabase connected")
 
 # -------------------------
-# 2) CSV helpers
+# 2) Local store helpers
 # -------------------------
-def fetch_all_records():
-    df = pd.DataFrame(columns=["id","user_name","mf_name","purchase_date","purchase_nav","units","amount","notes"])
+def _raw_fetch_all_records():
+    df = pd.DataFrame(columns=RECORD_COLUMNS)
     if use_db:
         try:
-            resp = supabase.table(TABLE_NAME).select("*").execute()
+            resp = supabase.table(TABLE_NAME).select(",".join(RECORD_COLUMNS)).execute()
             df = pd.DataFrame(resp.data or [])
-            for col in ["id","user_name","mf_name","purchase_date","purchase_nav","units","amount","notes"]:
+            for col in RECORD_COLUMNS:
                 if col not in df.columns:
                     df[col] = None
         except Exception as e:
-            st.warning(f"Supabase fetch failed, using CSV: {e}")
-    if df.empty and os.path.exists(LOCAL_CSV):
-        df_csv = pd.read_csv(LOCAL_CSV)
-        for col in ["id","user_name","mf_name","purchase_date","purchase_nav","units","amount","notes"]:
-            if col not in df_csv.columns:
-                df_csv[col] = None
-        df = df_csv
+            st.warning(f"Supabase fetch failed, using local store: {e}")
+    if df.empty:
+        df_local = load_local_store()
+        if not df_local.empty:
+            for col in RECORD_COLUMNS:
+                if col not in df_local.columns:
+                    df_local[col] = None
+            df = df_local
+    # low-cardinality string columns: category dtype keeps filters/sorts on integer codes
+    if len(df):
+        for c in CATEGORICAL_COLUMNS:
+            df[c] = df[c].astype("category")
+        # parse dates once at load; ISO strings stay on the wire and in the journal
+        df["purchase_date"] = pd.to_datetime(df["purchase_date"], errors="coerce")
+        # normalize codes here so the refresh path joins on clean keys
+        df["scheme_code"] = df["scheme_code"].astype("string").str.strip()
+        # enforce float dtypes once so downstream math never re-coerces
+        for c in ("purchase_nav", "units", "amount", "current_nav", "profit_loss"):
+            df[c] = pd.to_numeric(df[c], errors="coerce")
     return df
 
-def save_csv(df):
-    df.to_csv(LOCAL_CSV, index=False)
+@st.cache_resource(show_spinner=False)
+def _holdings_holder():
+    # mutable holder shared across reruns: cache_data would deep-copy the
+    # frame on every hit, so mutations go directly to this one instance
+    return {"df": _raw_fetch_all_records(), "rev": 0}
 
-def insert_record(record):
-    record["id"] = record.get("id", str(uuid.uuid4()))
-    if use_db:
-        try:
-            supabase.table(TABLE_NAME).insert(record).execute()
-        except Exception as e:
-            st.warning(f"Supabase insert failed: {e}")
-    # always save to CSV
+def fetch_all_records():
+    return _holdings_holder()["df"]
+
+def _bump_rev():
+    holder = _holdings_holder()
+    holder["rev"] += 1
+
+@st.cache_data(ttl=60, max_entries=16, show_spinner=False)
+def _user_view(user, rev):
+    # rev keys the snapshot: reruns between mutations reuse the same
+    # filtered frame instead of re-filtering the whole table
     df = fetch_all_records()
-    df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
-    save_csv(df)
+    return df[df["user_name"] == user]
 
-def update_record(record_id, updates: dict):
-    if use_db:
+def fetch_records_for_user(user):
+    return _user_view(user, _holdings_holder()["rev"])
+
+def invalidate_holdings():
+    _holdings_holder.clear()
+    _user_view.clear()
+    metrics_for_user.clear()
+
+def save_store(df):
+    df.to_parquet(LOCAL_PARQUET, index=False, compression="zstd")
+    if os.path.exists(LOCAL_CSV):
+        # journal rows are now folded into the Parquet store
+        os.remove(LOCAL_CSV)
+
+def append_csv(records):
+    # plain csv.writer: no single-row DataFrame construction per insert
+    new_file = not os.path.exists(LOCAL_CSV)
+    with open(LOCAL_CSV, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(RECORD_COLUMNS)
+        for rec in records:
+            writer.writerow([rec.get(c) for c in RECORD_COLUMNS])
+
+def load_local_store():
+    frames = []
+    if os.path.exists(LOCAL_PARQUET):
         try:
-            supabase.table(TABLE_NAME).update(updates).eq("id", record_id).execute()
-        except Exception as e:
-            st.warning(f"Supabase update failed: {e}")
+            # project the read down to the record columns; stores written
+            # before a schema change fall back to a full read
+            frames.append(pd.read_parquet(LOCAL_PARQUET, columns=RECORD_COLUMNS))
+        except (KeyError, ValueError):
+            frames.append(pd.read_parquet(LOCAL_PARQUET))
+    if os.path.exists(LOCAL_CSV):
+        frames.append(pd.read_csv(LOCAL_CSV))
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if "id" in df.columns:
+        df = df.drop_duplicates("id", keep="last")
+    return df
+
+@st.cache_resource
+def _start_write_worker():
+    # single daemon thread drains queued Supabase writes off the render path
+    q = queue.Queue()
+    q.errors = []
+
+    def _drain():
+        while True:
+            build = q.get()
+            try:
+                build().execute()
+            except Exception as e:
+                q.errors.append(str(e))
+            finally:
+                q.task_done()
+
+    threading.Thread(target=_drain, daemon=True).start()
+    return q
+
+def enqueue_db_write(build):
+    if not use_db:
+        return
+    q = _start_write_worker()
+    while q.errors:
+        st.warning(f"Background Supabase write failed: {q.errors.pop(0)}")
+    q.put(build)
+
+def insert_records(records):
+    # bulk-capable: one batched Supabase insert and one journal append,
+    # whether called with a single row or a whole CSV import
+    for rec in records:
+        rec["id"] = rec.get("id", str(uuid.uuid4()))
+    enqueue_db_write(lambda: supabase.table(TABLE_NAME).insert(records))
+    append_csv(records)
     df = fetch_all_records()
-    for col, val in updates.items():
-        df.loc[df["id"]==record_id, col] = val
-    save_csv(df)
+    for c in CATEGORICAL_COLUMNS:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            new_vals = {r.get(c) for r in records if r.get(c) is not None} - set(df[c].cat.categories)
+            if new_vals:
+                df[c] = df[c].cat.add_categories(sorted(new_vals))
+    start = len(df)
+    for i, rec in enumerate(records):
+        df.loc[start + i] = [rec.get(c) for c in df.columns]
+    if df["purchase_date"].dtype == object:
+        # appending string dates can upcast the column; re-normalize once
+        df["purchase_date"] = pd.to_datetime(df["purchase_date"], errors="coerce")
+    _bump_rev()
+    return records
 
-def delete_record(record_id):
-    if use_db:
-        try:
-            supabase.table(TABLE_NAME).delete().eq("id", record_id).execute()
-        except Exception as e:
-            st.warning(f"Supabase delete failed: {e}")
+def insert_record(record):
+    return insert_records([record])[0]
+
+def update_records_bulk(update_list):
+    # overlap the per-row round-trips instead of blocking on each in turn;
+    # warnings are raised from the main thread after the pool drains
+    if use_db and update_list:
+        def _push(u):
+            try:
+                supabase.table(TABLE_NAME).update(u["updates"]).eq("id", u["id"]).execute()
+            except Exception as e:
+                return str(e)
+        with ThreadPoolExecutor(max_workers=16) as ex:
+            for err in ex.map(_push, update_list):
+                if err:
+                    st.warning(f"Supabase update failed: {err}")
     df = fetch_all_records()
-    df = df[df["id"] != record_id]
-    save_csv(df)
+    for u in update_list:
+        for col, val in u["updates"].items():
+            df.loc[df["id"] == u["id"], col] = val
+    save_store(df)
+    _bump_rev()
+
+def delete_record(record_id):
+    enqueue_db_write(lambda: supabase.table(TABLE_NAME).delete().eq("id", record_id))
+    holder = _holdings_holder()
+    df = holder["df"]
+    df.drop(df.index[df["id"] == record_id], inplace=True)
+    # close the hole in the RangeIndex: insert_records appends at len(df),
+    # which would otherwise be the label of a surviving row
+    df.reset_index(drop=True, inplace=True)
+    save_store(df)
+    _bump_rev()
 
 # -------------------------
 # 3) Compute amount/units
 # -------------------------
+@functools.lru_cache(maxsize=128)
 def compute_amount_units(amount, units, purchase_nav):
-    if purchase_nav and amount and not units:
-        units = amount / purchase_nav
-    elif purchase_nav and units and not amount:
-        amount = units * purchase_nav
-    return float(amount or 0.0), float(units or 0.0)
+    # runs on every rerun of the add form; memoized since the same
+    # (amount, units, nav) tuple repeats across reruns within a session
+    # cleared data_editor cells arrive as NaN, which is truthy and would
+    # slip through the `or 0.0` fallbacks — zero them explicitly
+    amount = 0.0 if pd.isna(amount) else float(amount or 0.0)
+    units = 0.0 if pd.isna(units) else float(units or 0.0)
+    nav = 0.0 if pd.isna(purchase_nav) else float(purchase_nav or 0.0)
+    if nav <= 0.0:
+        return amount, units
+    if units == 0.0 and amount > 0.0:
+        units = amount / nav
+    elif amount == 0.0 and units > 0.0:
+        amount = units * nav
+    return amount, units
+
+def cagr_vec(start, end, years):
+    # branchless: invalid inputs are masked to NaN instead of raised on
+    valid = (start > 0) & (end > 0) & (years > 0)
+    out = np.full(np.shape(start), np.nan, dtype=np.float64)
+    out[valid] = np.expm1(np.log(end[valid] / start[valid]) / years[valid])
+    return out
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def metrics_for_user(user, rev, today):
+    # keyed by (user, rev, today): recomputed only when holdings mutate
+    # or the day rolls over, not on every widget interaction
+    df_user = _user_view(user, rev)
+    amount = pd.to_numeric(df_user["amount"], errors="coerce").to_numpy()
+    units = pd.to_numeric(df_user["units"], errors="coerce").to_numpy()
+    if "current_nav" in df_user.columns:
+        current_nav = pd.to_numeric(df_user["current_nav"], errors="coerce").to_numpy()
+    else:
+        current_nav = np.full(len(df_user), np.nan)
+    current_value = current_nav * units
+    purchase = pd.to_datetime(df_user["purchase_date"], errors="coerce").to_numpy().astype("datetime64[D]")
+    # timedelta division maps NaT to NaN; astype(float64) would turn the
+    # NaT sentinel into a huge negative number
+    years = (np.datetime64(today) - purchase) / np.timedelta64(1, "D") / 365.25
+    safe_amount = np.where(amount > 0, amount, np.nan)
+    return pd.DataFrame({
+        "mf_name": df_user["mf_name"].to_numpy(),
+        "invested": amount,
+        "current_value": current_value,
+        "abs_return_%": (current_value - amount) / safe_amount * 100,
+        "cagr_%": cagr_vec(amount, current_value, years) * 100,
+        "years": years,
+    })
+
+# -------------------------
+# 4) AMFI latest NAVs
+# -------------------------
+AMFI_NAV_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+NAV_COLUMNS = ["Scheme Code", "ISIN1", "ISIN2", "Scheme Name", "Net Asset Value", "Date"]
+AMFI_CACHE_PARQUET = "amfi_cache.parquet"
+AMFI_CACHE_META = "amfi_cache.meta.json"
+
+def _amfi_conditional_headers():
+    if not (os.path.exists(AMFI_CACHE_META) and os.path.exists(AMFI_CACHE_PARQUET)):
+        return {}
+    try:
+        with open(AMFI_CACHE_META) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+def _save_amfi_cache(nav_df, resp_headers):
+    try:
+        nav_df.to_parquet(AMFI_CACHE_PARQUET, index=False, compression="zstd")
+        with open(AMFI_CACHE_META, "w") as f:
+            json.dump({"etag": resp_headers.get("ETag"),
+                       "last_modified": resp_headers.get("Last-Modified")}, f)
+    except Exception:
+        # the disk cache is best-effort; the parsed frame is still returned
+        pass
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_amfi_nav_df(url=AMFI_NAV_URL):
+    # stream the ~20MB body straight into the parser instead of buffering
+    # the whole text plus a StringIO copy in memory; conditional headers let
+    # AMFI answer 304 when the file is unchanged, skipping the parse entirely
+    with get_http().get(url, timeout=15, stream=True, headers=_amfi_conditional_headers()) as r:
+        if r.status_code == 304:
+            return pd.read_parquet(AMFI_CACHE_PARQUET)
+        r.raise_for_status()
+        resp_headers = r.headers  # case-insensitive; survives the context exit
+        r.raw.decode_content = True
+        if pa is not None:
+            # multi-threaded Arrow parser, pruned to the three columns we use
+            table = pacsv.read_csv(
+                r.raw,
+                read_options=pacsv.ReadOptions(autogenerate_column_names=True, block_size=1 << 20),
+                parse_options=pacsv.ParseOptions(delimiter=";", invalid_row_handler=lambda _: "skip"),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=["f0", "f3", "f4"],
+                    column_types={"f0": pa.string(), "f3": pa.string(), "f4": pa.string()},
+                ),
+            )
+            nav_df = table.rename_columns(
+                ["Scheme Code", "Scheme Name", "Net Asset Value"]
+            ).to_pandas(self_destruct=True, types_mapper=pd.ArrowDtype)
+        else:
+            nav_df = pd.read_csv(
+                r.raw,
+                sep=";", engine="c", header=None, usecols=[0, 3, 4],
+                names=NAV_COLUMNS, dtype="string", on_bad_lines="skip",
+            )
+    # fund-house headings, blanks and the header line parse as rows without
+    # a numeric scheme code — drop them in one vectorized pass
+    nav_df["Scheme Code"] = nav_df["Scheme Code"].str.strip()
+    nav_df = nav_df[nav_df["Scheme Code"].str.isdigit().fillna(False)]
+    nav_df["Net Asset Value"] = pd.to_numeric(
+        nav_df["Net Asset Value"].str.replace(",", "", regex=False), errors="coerce"
+    )
+    _save_amfi_cache(nav_df, resp_headers)
+    return nav_df
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def amfi_nav_index():
+    # hash indexes built once per NAV download: name->NAV for matching,
+    # code->NAV and name->code for exact scheme-code joins
+    nav_df = fetch_amfi_nav_df()
+    keys = nav_df["Scheme Name"].str.lower().str.strip()
+    nav_map = dict(zip(keys, nav_df["Net Asset Value"]))
+    nav_by_code = dict(zip(nav_df["Scheme Code"], nav_df["Net Asset Value"]))
+    return nav_map, sorted(nav_map), nav_by_code
+
+def refresh_navs_for_all():
+    df = fetch_all_records()
+    if df.empty:
+        return
+    nav_map, sorted_keys, nav_by_code = amfi_nav_index()
+
+    # scheme codes give an exact O(1) join; name matching is only a fallback
+    # for legacy rows saved before codes were stored
+    df["current_nav"] = df["scheme_code"].map(nav_by_code)
+    hold_keys = df["mf_name"].astype(str).str.lower().str.strip()
+    need = df["current_nav"].isna()
+    df.loc[need, "current_nav"] = hold_keys[need].map(nav_map)
+
+    # prefix fallback only for the rows the exact maps missed
+    for idx in df.index[df["current_nav"].isna()]:
+        key = hold_keys.at[idx]
+        if not key:
+            continue
+        i = bisect_left(sorted_keys, key)
+        if i < len(sorted_keys) and sorted_keys[i].startswith(key):
+            df.at[idx, "current_nav"] = nav_map[sorted_keys[i]]
+
+    # substring fallback: one Aho-Corasick pass over AMFI names covers all
+    # still-unmatched holdings at once, instead of a str.contains scan each
+    unmatched = df.index[df["current_nav"].isna()]
+    if len(unmatched) and ahocorasick is not None:
+        # multiple purchases of one fund share a pattern, and add_word keys
+        # by pattern — collect every row per name so none are dropped
+        pat_rows = {}
+        for idx in unmatched:
+            pat = str(df.at[idx, "mf_name"]).lower().strip()
+            if pat:
+                pat_rows.setdefault(pat, []).append(idx)
+        automaton = ahocorasick.Automaton()
+        for pat, rows in pat_rows.items():
+            automaton.add_word(pat, rows)
+        automaton.make_automaton()
+        for key, nav in nav_map.items():
+            for _, rows in automaton.iter(key):
+                for idx in rows:
+                    if pd.isna(df.at[idx, "current_nav"]):
+                        df.at[idx, "current_nav"] = nav
+
+    # columns are float64 since load, so this is raw ufunc math on the
+    # underlying arrays; NaN propagates for unmatched schemes
+    nav = pd.to_numeric(df["current_nav"], errors="coerce").to_numpy(dtype="float64")
+    purchase_nav = df["purchase_nav"].to_numpy(dtype="float64")
+    units = df["units"].to_numpy(dtype="float64")
+    df["current_nav"] = nav
+    df["profit_loss"] = (nav - purchase_nav) * units
+    df["current_value"] = nav * units
+    if use_db:
+        matched = df[df["current_nav"].notna()]
+        updates = matched[["id", "current_nav", "profit_loss"]].to_dict("records")
+        for i in range(0, len(updates), 1000):
+            try:
+                supabase.table(TABLE_NAME).upsert(updates[i:i + 1000], on_conflict="id").execute()
+            except Exception as e:
+                st.warning(f"Supabase NAV update failed: {e}")
+    save_store(df)
+    _bump_rev()
 
 # -------------------------
-# 4) Load AMFI schemes for autocomplete
+# 5) Load AMFI schemes for autocomplete
 # -------------------------
-amfi_df = pd.read_csv("amfi_schemes.csv", sep=';', encoding='utf-8', on_bad_lines='skip')
-amfi_df.columns = amfi_df.columns.str.strip()
-scheme_names = amfi_df["Scheme Name"].unique().tolist()
+# Arrow-backed strings skip the per-cell PyObject overhead and run .str ops
+# on Arrow's C++ kernels; plain StringDtype is the no-pyarrow fallback
+_SCHEME_STR_DTYPE = "string[pyarrow]" if pa is not None else "string"
+
+@st.cache_data(persist="disk", show_spinner=False)
+def load_scheme_names():
+    amfi_df = pd.read_csv(
+        "amfi_schemes.csv", sep=';', encoding='utf-8', on_bad_lines='skip',
+        usecols=["Scheme Name"], dtype={"Scheme Name": _SCHEME_STR_DTYPE}, engine="c",
+    )
+    # section-heading rows parse as NA scheme names; drop them here so the
+    # selectbox and the search index only ever see real strings. Strip to
+    # match load_scheme_codes' keys — dozens of names ship with trailing
+    # spaces, and an unstripped selectbox value would miss the codes dict
+    return amfi_df["Scheme Name"].str.strip().dropna().unique().tolist()
+
+@st.cache_data(persist="disk", show_spinner=False)
+def load_scheme_codes():
+    amfi_df = pd.read_csv(
+        "amfi_schemes.csv", sep=';', encoding='utf-8', on_bad_lines='skip',
+        usecols=["Scheme Code", "Scheme Name"], dtype=_SCHEME_STR_DTYPE, engine="c",
+    )
+    return dict(zip(amfi_df["Scheme Name"].str.strip(), amfi_df["Scheme Code"].str.strip()))
+
+@st.cache_data(show_spinner=False)
+def _scheme_names_lc():
+    # lowercasing runs through the C-level str kernel, once, inside the cache;
+    # np.array infers the full <U width — to_numpy(dtype=str) truncates to
+    # <U1 whenever the series holds an NA
+    names = load_scheme_names()
+    return names, np.array(pd.Series(names, dtype=_SCHEME_STR_DTYPE).str.lower().tolist())
+
+@st.cache_data(show_spinner=False)
+def search_schemes(query, limit=20):
+    # server-side search-as-you-type: only the top matches reach the widget,
+    # not the full ~40k-entry list
+    names, names_lc = _scheme_names_lc()
+    q = str(query).lower().strip()
+    if not q:
+        return names[:limit]
+    hits = [names[i] for i in np.flatnonzero(np.char.startswith(names_lc, q))[:limit]]
+    if len(hits) < limit and rf_process is not None:
+        for name, _score, _idx in rf_process.extract(query, names, scorer=rf_fuzz.WRatio, limit=limit):
+            if name not in hits:
+                hits.append(name)
+            if len(hits) >= limit:
+                break
+    return hits
 
 # -------------------------
-# 5) Sync CSV -> Supabase on start
+# 6) Sync CSV -> Supabase on start
 # -------------------------
-if use_db:
-    st.info("Syncing CSV to Supabase...")
-    df_csv = pd.DataFrame()
-    if os.path.exists(LOCAL_CSV):
-        df_csv = pd.read_csv(LOCAL_CSV)
-    resp = supabase.table(TABLE_NAME).select("*").execute()
-    db_df = pd.DataFrame(resp.data or [])
-
-    if "id" not in df_csv.columns:
-        df_csv["id"] = [str(uuid.uuid4()) for _ in range(len(df_csv))]
-    if "id" not in db_df.columns:
-        db_df["id"] = [str(uuid.uuid4()) for _ in range(len(db_df))]
-
-    # insert CSV-only rows to Supabase
-    csv_only = df_csv[~df_csv["id"].isin(db_df["id"])]
-    for _, r in csv_only.iterrows():
+@st.cache_resource(ttl=300)
+def _sync_once():
+    # push local-only rows up; delta sync on ids, once per process instead of every rerun
+    df_local = load_local_store()
+    if df_local.empty:
+        return True
+    if "id" not in df_local.columns:
+        df_local["id"] = [str(uuid.uuid4()) for _ in range(len(df_local))]
+        save_store(df_local)
+    resp = supabase.table(TABLE_NAME).select("id").execute()
+    db_ids = {r["id"] for r in (resp.data or [])}
+    local_only = df_local[~df_local["id"].isin(db_ids)]
+    records = local_only.to_dict("records")
+    # one bulk upsert per 1000-row chunk instead of a round-trip per row
+    for i in range(0, len(records), 1000):
         try:
-            supabase.table(TABLE_NAME).insert(r.to_dict()).execute()
+            supabase.table(TABLE_NAME).upsert(records[i:i + 1000], on_conflict="id").execute()
         except Exception as e:
-            st.warning(f"Supabase insert during sync failed: {e}")
+            st.warning(f"Supabase sync failed: {e}")
+    return True
 
-    # update CSV with full DB data
-    resp = supabase.table(TABLE_NAME).select("*").execute()
-    db_df = pd.DataFrame(resp.data or [])
-    save_csv(db_df)
-    st.success("✅ CSV ↔ Supabase sync complete")
+if use_db:
+    _sync_once()
 
 # -------------------------
-# 6) Streamlit UI
+# 7) Streamlit UI
 # -------------------------
 st.title("📊 MF Tracker - Supabase + CSV backup")
 
@@ -139,8 +545,14 @@ st.title("📊 MF Tracker - Supabase + CSV backup")
 user_name = st.text_input("Enter user name", value="Guest")
 
 # ---- Add Holding ----
+# the search box sits outside the form so each keystroke refreshes the
+# candidate list; the form itself only reruns on submit
+scheme_query = st.text_input("Search scheme name")
+scheme_options = search_schemes(scheme_query)
+if not scheme_options:
+    st.warning("No schemes match that search — adjust the query above.")
 with st.form("add_holding_form"):
-    mf_name = st.selectbox("Mutual Fund Name", scheme_names)
+    mf_name = st.selectbox("Mutual Fund Name", scheme_options)
     purchase_date = st.date_input("Purchase Date", value=date.today())
     purchase_nav = st.number_input("Purchase NAV", min_value=0.0, format="%.4f")
     
@@ -156,51 +568,95 @@ with st.form("add_holding_form"):
     st.info(f"Preview — Amount: ₹{amount:.2f} | Units: {units:.6f}")
 
     if st.form_submit_button("Save Holding"):
-        record = {
-            "id": str(uuid.uuid4()),
-            "user_name": user_name,
-            "mf_name": mf_name,
-            "purchase_date": str(purchase_date),
-            "purchase_nav": purchase_nav,
-            "units": units,
-            "amount": amount,
-            "notes": notes
-        }
-        insert_record(record)
-        st.success("✅ Holding saved!")
+        if mf_name is None:
+            # an empty selectbox returns None; don't let it into the store
+            st.warning("Pick a scheme before saving.")
+        else:
+            record = {
+                "id": str(uuid.uuid4()),
+                "user_name": user_name,
+                "mf_name": mf_name,
+                "scheme_code": load_scheme_codes().get(mf_name),
+                "purchase_date": str(purchase_date),
+                "purchase_nav": purchase_nav,
+                "units": units,
+                "amount": amount,
+                "notes": notes
+            }
+            insert_record(record)
+            st.success("✅ Holding saved!")
 
 # ---- Show Holdings ----
 st.header(f"📂 Holdings for {user_name}")
-df_user = fetch_all_records()
-df_user = df_user[df_user["user_name"] == user_name]
+col_nav, col_reload = st.columns(2)
+with col_nav:
+    if st.button("🔄 Refresh NAVs"):
+        refresh_navs_for_all()
+        st.session_state["last_nav_refresh"] = time.time()
+        st.success("✅ NAVs refreshed!")
+with col_reload:
+    if st.button("♻️ Reload from database"):
+        invalidate_holdings()
+        st.experimental_rerun()
+df_user = fetch_records_for_user(user_name)
+
+# hourly TTL keeps NAVs fresh without a refresh on every interaction;
+# the button above force-bypasses it
+if not df_user.empty and time.time() - st.session_state.get("last_nav_refresh", 0) > 3600:
+    refresh_navs_for_all()
+    st.session_state["last_nav_refresh"] = time.time()
+    df_user = fetch_records_for_user(user_name)
 
 if df_user.empty:
     st.info("No holdings yet.")
 else:
-    for idx, row in df_user.iterrows():
-        st.write(f"**{row['mf_name']} | {row['purchase_date']}**")
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            amount_update = st.number_input(f"Amount {row['id']}", value=float(row["amount"]), key=f"amt_{row['id']}")
-        with col2:
-            units_update = st.number_input(f"Units {row['id']}", value=float(row["units"]), key=f"units_{row['id']}")
-        with col3:
-            purchase_nav_update = st.number_input(f"Purchase NAV {row['id']}", value=float(row["purchase_nav"]), format="%.4f", key=f"nav_{row['id']}")
-        with col4:
-            notes_update = st.text_input(f"Notes {row['id']}", value=row.get("notes",""), key=f"notes_{row['id']}")
-
-        col5, col6 = st.columns(2)
-        with col5:
-            if st.button("Update", key=f"update_{row['id']}"):
-                new_amount, new_units = compute_amount_units(amount_update, units_update, purchase_nav_update)
-                update_record(row['id'], {
-                    "amount": new_amount,
-                    "units": new_units,
-                    "purchase_nav": purchase_nav_update,
-                    "notes": notes_update
-                })
-                st.experimental_rerun()
-        with col6:
-            if st.button("Delete", key=f"delete_{row['id']}"):
-                delete_record(row['id'])
-                st.experimental_rerun()
+    # one grid instead of N number_inputs: a single widget round-trip per rerun
+    editable_cols = ["amount", "units", "purchase_nav", "notes"]
+    display_cols = ["mf_name", "purchase_date"] + editable_cols
+    for col in ("current_nav", "current_value", "profit_loss"):
+        if col in df_user.columns:
+            display_cols.append(col)
+    grid = df_user.set_index("id")[display_cols]
+    edited = st.data_editor(
+        grid,
+        column_config={
+            "purchase_nav": st.column_config.NumberColumn(format="%.4f"),
+            "units": st.column_config.NumberColumn(format="%.6f"),
+            "amount": st.column_config.NumberColumn(format="%.2f"),
+        },
+        disabled=[c for c in display_cols if c not in editable_cols],
+        hide_index=True,
+        key="holdings_editor",
+    )
+
+    if st.button("Save changes"):
+        # NaN-aware diff: .ne treats NaN != NaN as a change, which would
+        # flag every row with empty notes on every click
+        old, new = grid[editable_cols], edited[editable_cols]
+        changed = (~((new == old) | (new.isna() & old.isna()))).any(axis=1)
+        update_list = []
+        for t in edited.loc[changed, editable_cols].itertuples():
+            new_amount, new_units = compute_amount_units(t.amount, t.units, t.purchase_nav)
+            update_list.append({"id": t.Index, "updates": {
+                "amount": new_amount,
+                "units": new_units,
+                "purchase_nav": 0.0 if pd.isna(t.purchase_nav) else t.purchase_nav,
+                "notes": None if pd.isna(t.notes) else t.notes,
+            }})
+        if update_list:
+            update_records_bulk(update_list)
+        st.experimental_rerun()
+
+    # ---- Metrics (vectorized, no per-row Python) ----
+    st.subheader("📈 Metrics")
+    st.dataframe(metrics_for_user(user_name, _holdings_holder()["rev"], date.today()))
+
+    # one label build serves both the selectbox and the reverse lookup
+    labels = df_user["mf_name"].astype(str) + " | " + df_user["purchase_date"].dt.strftime("%Y-%m-%d")
+    id_by_label = dict(zip(labels, df_user["id"]))
+    to_delete = st.selectbox("Holding to delete", labels)
+    if st.button("Delete"):
+        delete_record(id_by_label[to_delete])
+        st.experimental_rerun()
+
+    st.download_button("⬇️ Export CSV", df_user.to_csv(index=False), file_name="holdings.csv")